@@ -0,0 +1,89 @@
+"""
+Extraction Cache Module
+Persistent content-addressable cache for LLM results. Entries live in one
+subdirectory per namespace under CLAIM_CACHE_DIR:
+  extraction/ - intake vision and structured extraction results
+  decisions/  - agent adjudication decisions
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Optional, Union
+
+
+logger = logging.getLogger("extraction_cache")
+
+CACHE_DIR = os.getenv("CLAIM_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache"))
+
+EXTRACTION_NAMESPACE = "extraction"
+DECISIONS_NAMESPACE = "decisions"
+
+
+# ============================================================================
+# KEY DERIVATION
+# ============================================================================
+
+def make_key(*parts: Union[str, bytes]) -> str:
+    """
+    Builds a SHA256 key from the given parts.
+    Each part is length-prefixed (8 bytes) so different splits never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+def _path_for(key: str, namespace: str) -> str:
+    return os.path.join(CACHE_DIR, namespace, key[:2], f"{key}.json")
+
+
+def get(key: str, max_age: Optional[float] = None, namespace: str = EXTRACTION_NAMESPACE) -> Optional[dict]:
+    """
+    Returns the cached payload for key, or None on miss
+    Entries older than max_age seconds (if given) count as misses and are evicted.
+    """
+    path = _path_for(key, namespace)
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            evict(key, namespace)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put(key: str, value: dict, namespace: str = EXTRACTION_NAMESPACE) -> None:
+    """Stores payload under key (atomic replace, failures are non-fatal)"""
+    path = _path_for(key, namespace)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique temp file per writer, so concurrent threads never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Failed to write %s cache entry: %s", namespace, e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict(key: str, namespace: str = EXTRACTION_NAMESPACE) -> None:
+    """Removes a cache entry (e.g. when it no longer validates)"""
+    try:
+        os.remove(_path_for(key, namespace))
+    except OSError:
+        pass
@@ -3,24 +3,50 @@ Insurance Claim Intake Module
 Handles processing of claim data from multiple input formats (text, images, PDFs)
 """
 
-import base64
-import mimetypes
+import asyncio
+import hashlib
+import json
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Optional
 
-from langchain_core.messages import HumanMessage
-from pydantic import BaseModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, ConfigDict, ValidationError
 
+import extraction_cache
+import numba_b64
 from config import llm
 from state import IntakeResult, ExtractedClaimData
 
 
+logger = logging.getLogger("intake")
+
+# Bump when extraction prompts change so stale cache entries are not reused
+PROMPT_VERSION = "v2"
+
+# Upper bound on concurrent LLM calls made while processing a single claim
+MAX_WORKERS = 8
+
+# Claim text longer than this is split into shards extracted concurrently
+SHARD_CHARS = 12000
+MAX_SHARDS = 4
+
+# Claim text shorter than this carries too little signal to be worth an LLM call
+MIN_CLAIM_CHARS = 40
+
+# Keys that mark a JSON text input as already-structured claim data
+STRUCTURED_CLAIM_KEYS = frozenset({"member_id", "claim_amount", "diagnosis"})
+
+
 # ============================================================================
 # STRUCTURED EXTRACTION MODEL
 # ============================================================================
 
 class ClaimExtraction(BaseModel):
     """Structured claim data for LLM extraction"""
+    model_config = ConfigDict(validate_assignment=False, extra="ignore")
+    
     member_id: Optional[str] = None
     member_name: Optional[str] = None
     policy_number: Optional[str] = None
@@ -35,51 +61,139 @@ class ClaimExtraction(BaseModel):
 
 extraction_model = llm.with_structured_output(ClaimExtraction)
 
+# Static instructions go first so the provider can reuse the cached prompt prefix
+SYSTEM_EXTRACTION_PROMPT = """Extract the following information from the insurance claim text provided by the user. 
+If a field is not found, leave it as null.
+
+Extract: member_id, member_name, policy_number, treatment_date, claim_amount (as number), 
+diagnosis, doctor_name, hospital_name, claim_type (one of: consultation, diagnostic, pharmacy, dental, vision, alternative_medicine, general), 
+and a brief summary of the claim."""
+
 
 # ============================================================================
 # INPUT TYPE DETECTION
 # ============================================================================
 
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"})
+PDF_EXTENSION = ".pdf"
+MAX_PATH_LENGTH = 4096
+
+
 def detect_input_type(input_path: str) -> str:
     """
     Determines input type: 'image', 'pdf', or 'text'
+    Only touches the filesystem when the input looks like a supported file path.
     """
-    if not os.path.exists(input_path):
+    if len(input_path) > MAX_PATH_LENGTH or "\n" in input_path:
         return "text"
     
-    mime_type, _ = mimetypes.guess_type(input_path)
-    if mime_type:
-        if mime_type.startswith("image/"):
-            return "image"
-        if mime_type == "application/pdf":
-            return "pdf"
+    dot = input_path.rfind(".")
+    if dot < 0:
+        return "text"
     
-    ext = os.path.splitext(input_path)[1].lower()
-    if ext in {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}:
-        return "image"
-    if ext == ".pdf":
-        return "pdf"
+    ext = input_path[dot:].lower()
+    if ext in IMAGE_EXTENSIONS:
+        input_type = "image"
+    elif ext == PDF_EXTENSION:
+        input_type = "pdf"
+    else:
+        return "text"
     
-    return "text"
+    return input_type if os.path.exists(input_path) else "text"
 
 
 # ============================================================================
 # IMAGE PROCESSING
 # ============================================================================
 
-def encode_image_to_base64(image_path: str) -> str:
-    """Converts image file to base64 data URL"""
+# Images above this size are downscaled/recompressed before upload; the vision
+# model resizes to at most 2048px anyway, so the extra bytes are wasted
+MAX_IMAGE_BYTES = 4 * 1024 * 1024
+MAX_IMAGE_SIDE = 2048
+
+
+# Leading magic bytes -> MIME type (WEBP is checked separately: RIFF....WEBP)
+MAGIC_MIME_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"%PDF", "application/pdf"),
+)
+
+EXTENSION_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+}
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """Identifies supported image/PDF formats from their leading bytes"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime_type in MAGIC_MIME_TYPES:
+        if data.startswith(magic):
+            return mime_type
+    return None
+
+
+def _read_image_bytes(image_path: str) -> tuple[bytes, str]:
+    """Reads an image file, returning its raw bytes and MIME type"""
     with open(image_path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode("utf-8")
-    
-    mime_type, _ = mimetypes.guess_type(image_path)
-    mime_type = mime_type or "image/jpeg"
+        raw = f.read()
     
-    return f"data:{mime_type};base64,{encoded}"
+    mime_type = sniff_mime_type(raw)
+    if mime_type is None:
+        ext = image_path[image_path.rfind("."):].lower()
+        mime_type = EXTENSION_MIME_TYPES.get(ext, "image/jpeg")
+    return raw, mime_type
+
+
+def _shrink_image(image_bytes: bytes, mime_type: str) -> tuple[bytes, str]:
+    """Downscales and JPEG-recompresses large images; returns input unchanged on failure"""
+    if len(image_bytes) <= MAX_IMAGE_BYTES:
+        return image_bytes, mime_type
+    try:
+        import fitz
+        
+        pix = fitz.Pixmap(image_bytes)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        factor = 0
+        while max(pix.width, pix.height) >> factor > MAX_IMAGE_SIDE:
+            factor += 1
+        if factor:
+            pix.shrink(factor)
+        return pix.tobytes("jpeg", jpg_quality=85), "image/jpeg"
+    except Exception as e:
+        logger.warning("Could not recompress image, sending original: %s", e)
+        return image_bytes, mime_type
+
 
+def _to_data_url(image_bytes: bytes, mime_type: str) -> str:
+    return f"data:{mime_type};base64,{numba_b64.b64encode(image_bytes).decode('ascii')}"
 
-def extract_text_from_image(base64_image: str) -> str:
-    """Uses vision LLM to extract claim information from image"""
+
+def extract_text_from_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
+    """
+    Uses vision LLM to extract claim information from image
+    
+    Args:
+        image_bytes: Raw image file contents
+        mime_type: MIME type of the image
+    """
+    # Key on the raw bytes so a cache hit costs a single hash, no encoding
+    cache_key = extraction_cache.make_key(llm.model_name, PROMPT_VERSION, "image", hashlib.sha256(image_bytes).digest())
+    cached = extraction_cache.get(cache_key)
+    if cached and isinstance(cached.get("text"), str):
+        logger.info("Image extraction cache hit")
+        return cached["text"]
+    
     prompt = """Extract all insurance claim information from this image including:
     - Patient/Member details (name, ID)
     - Doctor information (name, registration number)
@@ -93,32 +207,58 @@ def extract_text_from_image(base64_image: str) -> str:
     
     message = HumanMessage(content=[
         {"type": "text", "text": prompt},
-        {"type": "image_url", "image_url": {"url": base64_image}}
+        {"type": "image_url", "image_url": {"url": _to_data_url(*_shrink_image(image_bytes, mime_type))}}
     ])
     
     response = llm.invoke([message])
     content = response.content
     if isinstance(content, list):
-        return " ".join(str(item) for item in content)
-    return str(content)
+        text = " ".join(str(item) for item in content)
+    else:
+        text = str(content)
+    
+    extraction_cache.put(cache_key, {"text": text})
+    return text
 
 
 # ============================================================================
 # PDF PROCESSING
 # ============================================================================
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extracts all text from PDF file"""
+def extract_text_from_pdf(pdf_path: str, max_pages: Optional[int] = None) -> str:
+    """
+    Extracts all text from PDF file
+    
+    Pages without a text layer (scans) are rendered and read with the vision
+    LLM; those calls run concurrently.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        max_pages: Stop after this many pages (None reads the whole document)
+    """
     try:
-        import pypdf
+        import fitz
     except ImportError:
-        raise ImportError("pypdf is required. Install with: pip install pypdf")
+        raise ImportError("PyMuPDF is required. Install with: pip install pymupdf")
     
     pages = []
-    with open(pdf_path, "rb") as f:
-        reader = pypdf.PdfReader(f)
-        for page in reader.pages:
-            pages.append(page.extract_text())
+    scanned = {}  # page index -> rendered PNG
+    # fitz documents are not thread-safe, so parsing/rendering stays on this thread.
+    # Opening by path lets MuPDF read the file lazily through the OS page cache;
+    # an mmap'd stream would be copied into a Python bytes object instead.
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        for page_number, page in enumerate(doc):
+            if max_pages is not None and page_number >= max_pages:
+                break
+            text = page.get_text("text")
+            if not text.strip():
+                scanned[page_number] = page.get_pixmap(dpi=150).tobytes("png")
+            pages.append(text)
+    
+    if scanned:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(scanned))) as pool:
+            for page_number, text in zip(scanned, pool.map(extract_text_from_image, scanned.values(), ["image/png"] * len(scanned))):
+                pages[page_number] = text
     
     return "\n".join(pages)
 
@@ -127,37 +267,121 @@ def extract_text_from_pdf(pdf_path: str) -> str:
 # STRUCTURED DATA EXTRACTION
 # ============================================================================
 
-def extract_structured_data(claim_text: str) -> ExtractedClaimData:
+def _split_claim_text(claim_text: str) -> list[str]:
+    """Splits long claim text on line boundaries into at most MAX_SHARDS shards"""
+    if len(claim_text) <= SHARD_CHARS:
+        return [claim_text]
+    
+    target = max(SHARD_CHARS, -(-len(claim_text) // MAX_SHARDS))
+    shards, current, size = [], [], 0
+    for line in claim_text.splitlines(keepends=True):
+        if size + len(line) > target and current and len(shards) < MAX_SHARDS - 1:
+            shards.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        shards.append("".join(current))
+    return shards
+
+
+def _extraction_messages(claim_text: str) -> list:
+    return [
+        SystemMessage(content=SYSTEM_EXTRACTION_PROMPT),
+        HumanMessage(content=f"Claim Text:\n{claim_text}"),
+    ]
+
+
+async def _ainvoke_extraction(claim_text: str) -> ClaimExtraction:
+    return await extraction_model.ainvoke(_extraction_messages(claim_text))  # type: ignore
+
+
+def _merge_extractions(partials: list[ClaimExtraction]) -> ClaimExtraction:
     """
-    Uses LLM to extract structured claim data from text
+    Reduces per-shard extractions field-wise:
+    first non-null for scalars, max for claim_amount, concatenation for summary
     """
-    extraction_prompt = f"""Extract the following information from this insurance claim text. 
-If a field is not found, leave it as null.
+    merged = {}
+    for field in ClaimExtraction.model_fields:
+        values = [getattr(p, field) for p in partials if getattr(p, field) is not None]
+        if field == "claim_amount":
+            merged[field] = max(values) if values else None
+        elif field == "summary":
+            merged[field] = " ".join(values) or None
+        else:
+            merged[field] = values[0] if values else None
+    return ClaimExtraction(**merged)
 
-Claim Text:
-{claim_text}
 
-Extract: member_id, member_name, policy_number, treatment_date, claim_amount (as number), 
-diagnosis, doctor_name, hospital_name, claim_type (one of: consultation, diagnostic, pharmacy, dental, vision, alternative_medicine, general), 
-and a brief summary of the claim."""
+def parse_structured_claim(claim_text: str) -> Optional[ExtractedClaimData]:
+    """
+    Returns claim data directly when the text is a JSON object with claim fields,
+    otherwise None
+    """
+    stripped = claim_text.strip()
+    if not stripped.startswith("{"):
+        return None
+    try:
+        parsed = json.loads(stripped)
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict) or not STRUCTURED_CLAIM_KEYS & parsed.keys():
+        return None
+    try:
+        return ExtractedClaimData.model_validate(parsed)
+    except ValidationError:
+        return None
+
+
+def _structured_cache_key(claim_text: str) -> str:
+    return extraction_cache.make_key(llm.model_name, PROMPT_VERSION, "structured", claim_text)
 
+
+def _cached_extraction(cache_key: str) -> Optional[ClaimExtraction]:
+    cached = extraction_cache.get(cache_key)
+    if cached is None:
+        return None
     try:
-        result: ClaimExtraction = extraction_model.invoke(extraction_prompt)  # type: ignore
-        return ExtractedClaimData(
-            member_id=result.member_id,
-            member_name=result.member_name,
-            policy_number=result.policy_number,
-            treatment_date=result.treatment_date,
-            claim_amount=result.claim_amount,
-            diagnosis=result.diagnosis,
-            doctor_name=result.doctor_name,
-            hospital_name=result.hospital_name,
-            claim_type=result.claim_type,
-            summary=result.summary
-        )
+        result = ClaimExtraction.model_validate(cached)
+        logger.info("Structured extraction cache hit")
+        return result
+    except ValidationError:
+        extraction_cache.evict(cache_key)
+        return None
+
+
+def _to_extracted_data(result: ClaimExtraction) -> ExtractedClaimData:
+    # Fields were already validated by ClaimExtraction, so skip re-validation
+    return ExtractedClaimData.model_construct(**result.model_dump())
+
+
+def _fallback_extracted_data(claim_text: str) -> ExtractedClaimData:
+    return ExtractedClaimData(summary=claim_text[:200] + "..." if len(claim_text) > 200 else claim_text)
+
+
+async def aextract_structured_data(claim_text: str) -> ExtractedClaimData:
+    """
+    Uses LLM to extract structured claim data from text
+    Long texts are extracted shard-by-shard concurrently and merged.
+    """
+    if len(claim_text.strip()) < MIN_CLAIM_CHARS:
+        return ExtractedClaimData(summary=claim_text.strip() or None)
+    
+    cache_key = _structured_cache_key(claim_text)
+    result = _cached_extraction(cache_key)
+
+    try:
+        if result is None:
+            shards = _split_claim_text(claim_text)
+            if len(shards) == 1:
+                result = await _ainvoke_extraction(claim_text)
+            else:
+                result = _merge_extractions(list(await asyncio.gather(*map(_ainvoke_extraction, shards))))
+            extraction_cache.put(cache_key, result.model_dump())
+        return _to_extracted_data(result)
     except Exception as e:
-        print(f"[Intake] Error extracting structured data: {e}")
-        return ExtractedClaimData(summary=claim_text[:200] + "..." if len(claim_text) > 200 else claim_text)
+        logger.error("Error extracting structured data: %s", e)
+        return _fallback_extracted_data(claim_text)
 
 
 # ============================================================================
@@ -173,14 +397,14 @@ def preprocess_input(input_data: Union[str, bytes]) -> tuple[str, str]:
     input_type = detect_input_type(input_str)
     
     if input_type == "image":
-        print(f"[Intake] Processing image: {input_str}")
-        base64_image = encode_image_to_base64(input_str)
-        claim_description = extract_text_from_image(base64_image)
+        logger.info("Processing image: %s", input_str)
+        image_bytes, mime_type = _read_image_bytes(input_str)
+        claim_description = extract_text_from_image(image_bytes, mime_type)
     elif input_type == "pdf":
-        print(f"[Intake] Processing PDF: {input_str}")
+        logger.info("Processing PDF: %s", input_str)
         claim_description = extract_text_from_pdf(input_str)
     else:
-        print("[Intake] Processing raw text")
+        logger.info("Processing raw text")
         claim_description = input_str
     
     return claim_description, input_type
@@ -190,25 +414,30 @@ def preprocess_input(input_data: Union[str, bytes]) -> tuple[str, str]:
 # PUBLIC API
 # ============================================================================
 
-def intake_node(input_data: Union[str, bytes]) -> IntakeResult:
+async def aintake_node(input_data: Union[str, bytes]) -> IntakeResult:
     """
     Entry point for claim intake processing
     
+    File reading, PDF parsing and vision extraction run in a worker thread so
+    they don't block the event loop; structured extraction is awaited natively.
+    
     Args:
         input_data: Image path, PDF path, or raw text
         
     Returns:
         IntakeResult: Processed claim description, input type, and extracted data
     """
-    claim_description, input_type = preprocess_input(input_data)
-    print(f"[Intake] Claim description extracted ({input_type})")
+    claim_description, input_type = await asyncio.to_thread(preprocess_input, input_data)
+    logger.info("Claim description extracted (%s)", input_type)
     
-    # Extract structured data from the claim
-    extracted_data = extract_structured_data(claim_description)
-    print(f"[Intake] Structured data extracted: {extracted_data.member_name or 'Unknown'}")
+    # Extract structured data from the claim (skipped for JSON claim input)
+    extracted_data = parse_structured_claim(claim_description) if input_type == "text" else None
+    if extracted_data is None:
+        extracted_data = await aextract_structured_data(claim_description)
+    logger.info("Structured data extracted: %s", extracted_data.member_name or "Unknown")
     
     return IntakeResult(
         claim_description=claim_description,
         input_type=input_type,
         extracted_data=extracted_data
-    )
\ No newline at end of file
+    )
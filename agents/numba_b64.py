@@ -0,0 +1,53 @@
+"""
+Parallel Base64 Module
+Numba-compiled base64 encoder for large image payloads, with a stdlib fallback
+"""
+
+import base64
+import threading
+
+# Below this size JIT dispatch overhead outweighs the parallel speedup
+PARALLEL_THRESHOLD = 2 * 1024 * 1024
+
+_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+try:
+    import numpy as np
+    from numba import njit, prange
+except ImportError:
+    np = None
+
+
+# Numba's default workqueue threading layer is not re-entrant, so calls from
+# several Python threads (OCR pool, to_thread requests) are serialized
+_kernel_lock = threading.Lock()
+
+if np is not None:
+    _TABLE = np.frombuffer(_ALPHABET, dtype=np.uint8)
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def _encode_kernel(src, out, table):
+        n = src.shape[0] // 3
+        for i in prange(n):
+            b0, b1, b2 = src[3 * i], src[3 * i + 1], src[3 * i + 2]
+            out[4 * i] = table[b0 >> 2]
+            out[4 * i + 1] = table[((b0 & 3) << 4) | (b1 >> 4)]
+            out[4 * i + 2] = table[((b1 & 15) << 2) | (b2 >> 6)]
+            out[4 * i + 3] = table[b2 & 63]
+
+
+def b64encode(data: bytes) -> bytes:
+    """
+    Base64-encodes data, using the parallel Numba kernel for large inputs
+    when numba is installed and base64.b64encode otherwise
+    """
+    if np is None or len(data) < PARALLEL_THRESHOLD:
+        return base64.b64encode(data)
+
+    src = np.frombuffer(data, dtype=np.uint8)
+    full = len(data) // 3 * 3
+    out = np.empty(len(data) // 3 * 4, dtype=np.uint8)
+    with _kernel_lock:
+        _encode_kernel(src[:full], out, _TABLE)
+    # 1-2 trailing bytes need "=" padding; stdlib handles that tail
+    return out.tobytes() + base64.b64encode(data[full:])
@@ -1,20 +1,30 @@
+import os
 import re
+from typing import Optional
+from pydantic import ValidationError
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
-from tools import tools
+import extraction_cache
+from tools import tools, normalize_query
+from rag.rag import POLICY_VERSION
 from state import AgentResult
+from config import agent_llm as llm
 
 load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
 
+# Bump when SYSTEM_PROMPT changes so cached decisions are not reused
+AGENT_PROMPT_VERSION = "v1"
 
-# Create a proper agent prompt
-prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are an insurance claim adjudication agent. Your job: analyze medical claims, check policy terms, and approve or reject with clear reasoning.
+# Cached decisions expire after this many seconds
+AGENT_CACHE_TTL = float(os.getenv("AGENT_CACHE_TTL", 24 * 60 * 60))
+
+
+# Static system prompt - kept as its own message (never concatenated with the
+# claim) so OpenAI's automatic prefix cache can reuse it across agent steps
+SYSTEM_PROMPT = """You are an insurance claim adjudication agent. Your job: analyze medical claims, check policy terms, and approve or reject with clear reasoning.
 ## Process
 1. **Extract claim data**: member ID, treatment date, diagnosis, medications, tests, amounts
 2. **Query RAG system** using the policy_rag tool for relevant policies based on diagnosis, treatments, and member plan
@@ -44,7 +54,12 @@ POLICY REFERENCES: [Section numbers from RAG]
 - If info is missing, state what's needed
 - If uncertain, flag for human review
 - Be precise and factual
-- Confidence should reflect how well the claim matches policy terms"""),
+- Confidence should reflect how well the claim matches policy terms"""
+
+
+# Create a proper agent prompt
+prompt = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
     ("human", "{input}"),
     ("placeholder", "{agent_scratchpad}"),
 ])
@@ -53,23 +68,37 @@ POLICY REFERENCES: [Section numbers from RAG]
 agent = create_tool_calling_agent(llm, tools, prompt)
 
 # Create agent executor
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+# Verbose step tracing is costly on the request path; opt in with AGENT_VERBOSE=1
+agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=os.getenv("AGENT_VERBOSE", "0") == "1")
+
+
+# Response parsing patterns, compiled once at import
+# DECISION / APPROVED AMOUNT / CONFIDENCE are matched in a single pass
+HEADER_PATTERN = re.compile(
+    r"DECISION:\s*(?P<decision>APPROVED|REJECTED|PARTIAL)"
+    r"|APPROVED AMOUNT:\s*\$?(?P<amount>[\d,]+(?:\.\d{2})?)"
+    r"|CONFIDENCE:\s*(?P<confidence>\d+)",
+    re.IGNORECASE,
+)
+# Section markers; located in one scan, sections are then sliced out by offset
+SECTION_PATTERN = re.compile(r"REASONING:|POLICY REFERENCES:|CONFIDENCE:", re.IGNORECASE)
 
 
 def parse_agent_response(response: str) -> AgentResult:
     """Parse the agent's response into structured AgentResult"""
     
-    # Extract decision
-    decision_match = re.search(r"DECISION:\s*(APPROVED|REJECTED|PARTIAL)", response, re.IGNORECASE)
-    decision = decision_match.group(1).upper() if decision_match else "NEEDS_REVIEW"
-    
-    # Extract approved amount
-    amount_match = re.search(r"APPROVED AMOUNT:\s*\$?([\d,]+(?:\.\d{2})?)", response, re.IGNORECASE)
-    approved_amount = float(amount_match.group(1).replace(",", "")) if amount_match else None
+    # Extract decision, approved amount and confidence score (first occurrence of each)
+    headers = {}
+    for match in HEADER_PATTERN.finditer(response):
+        group = match.lastgroup
+        if group not in headers:
+            headers[group] = match.group(group)
+            if len(headers) == 3:
+                break
     
-    # Extract confidence score
-    confidence_match = re.search(r"CONFIDENCE:\s*(\d+)", response, re.IGNORECASE)
-    confidence_score = int(confidence_match.group(1)) if confidence_match else None
+    decision = headers["decision"].upper() if "decision" in headers else "NEEDS_REVIEW"
+    approved_amount = float(headers["amount"].replace(",", "")) if "amount" in headers else None
+    confidence_score = int(headers["confidence"]) if "confidence" in headers else None
     
     # If no explicit confidence, derive from decision clarity
     if confidence_score is None:
@@ -82,19 +111,33 @@ def parse_agent_response(response: str) -> AgentResult:
         else:
             confidence_score = 50
     
+    # Locate the reasoning and policy reference sections
+    reasoning_start = reasoning_end = refs_start = None
+    for match in SECTION_PATTERN.finditer(response):
+        marker = match.group().upper()
+        if marker == "REASONING:":
+            if reasoning_start is None:
+                reasoning_start = match.end()
+            continue
+        if reasoning_start is not None and reasoning_end is None:
+            reasoning_end = match.start()
+        if marker == "POLICY REFERENCES:" and refs_start is None:
+            refs_start = match.end()
+        if refs_start is not None and reasoning_end is not None:
+            break
+    
     # Extract reasoning
     reasoning = []
-    reasoning_match = re.search(r"REASONING:\s*(.*?)(?:POLICY REFERENCES:|CONFIDENCE:|$)", response, re.DOTALL | re.IGNORECASE)
-    if reasoning_match:
-        reasoning_text = reasoning_match.group(1)
-        reasoning = [line.strip().lstrip("- ") for line in reasoning_text.strip().split("\n") if line.strip() and line.strip() != "-"]
+    if reasoning_start is not None:
+        for line in response[reasoning_start:reasoning_end].splitlines():
+            line = line.strip()
+            if line and line != "-":
+                reasoning.append(line.lstrip("- "))
     
     # Extract policy references
     policy_refs = []
-    refs_match = re.search(r"POLICY REFERENCES:\s*(.*?)$", response, re.DOTALL | re.IGNORECASE)
-    if refs_match:
-        refs_text = refs_match.group(1)
-        policy_refs = [ref.strip() for ref in refs_text.strip().split(",") if ref.strip()]
+    if refs_start is not None:
+        policy_refs = [ref.strip() for ref in response[refs_start:].split(",") if ref.strip()]
     
     return AgentResult(
         decision=decision,
@@ -106,11 +149,55 @@ def parse_agent_response(response: str) -> AgentResult:
     )
 
 
-def run_agent(claim_description: str) -> AgentResult:
+def _agent_cache_key(claim_description: str) -> str:
+    return extraction_cache.make_key(llm.model_name, "agent", AGENT_PROMPT_VERSION, POLICY_VERSION, normalize_query(claim_description))
+
+
+def _cached_agent_result(cache_key: str) -> Optional[AgentResult]:
+    cached = extraction_cache.get(cache_key, max_age=AGENT_CACHE_TTL, namespace=extraction_cache.DECISIONS_NAMESPACE)
+    if cached is None:
+        return None
+    try:
+        return AgentResult.model_validate(cached)
+    except ValidationError:
+        extraction_cache.evict(cache_key, extraction_cache.DECISIONS_NAMESPACE)
+        return None
+
+
+def _store_agent_result(cache_key: str, result: AgentResult) -> None:
+    # NEEDS_REVIEW means the agent produced no usable decision; never persist it
+    if result.decision != "NEEDS_REVIEW":
+        extraction_cache.put(cache_key, result.model_dump(mode="json"), extraction_cache.DECISIONS_NAMESPACE)
+
+
+async def arun_agent(claim_description: str, policy_context: Optional[str] = None) -> AgentResult:
     """
     Run the insurance claim adjudication agent with the claim description.
+    Decisions are cached on disk (AGENT_CACHE_TTL), keyed on the model, prompt
+    and policy versions and the normalized description.
+    
+    Args:
+        claim_description: Claim text to adjudicate
+        policy_context: Policy text already retrieved for this claim; when given
+            it is included in the input so the agent can skip its first RAG call
     """
-    response = agent_executor.invoke({"input": claim_description})
+    cache_key = _agent_cache_key(claim_description)
+    cached = _cached_agent_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    agent_input = claim_description
+    if policy_context:
+        agent_input = f"{claim_description}\n\nRetrieved policy context (from policy_rag):\n{policy_context}"
+    
+    response = await agent_executor.ainvoke({"input": agent_input})
     output = response.get("output", "")
     
-    return parse_agent_response(output)
\ No newline at end of file
+    result = parse_agent_response(output)
+    _store_agent_result(cache_key, result)
+    return result
+
+
+def lookup_cached_agent_result(claim_description: str) -> Optional[AgentResult]:
+    """Returns the cached decision for this claim description, if any"""
+    return _cached_agent_result(_agent_cache_key(claim_description))
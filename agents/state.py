@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ClaimInput(BaseModel):
@@ -10,6 +10,8 @@ class ClaimInput(BaseModel):
 
 class ExtractedClaimData(BaseModel):
     """Structured claim data extracted by intake node"""
+    model_config = ConfigDict(validate_assignment=False, extra="ignore")
+    
     member_id: Optional[str] = None
     member_name: Optional[str] = None
     policy_number: Optional[str] = None
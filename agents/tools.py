@@ -1,14 +1,40 @@
+import asyncio
+
 from langchain.agents import tool
 from rag.rag import query_index
 
+# Bound on each retrieved document handed back to the agent (the document
+# count is capped by rag.MAX_DOCS at retrieval time)
+MAX_DOC_CHARS = 4000  # the ingested policy document is ~3k chars; keep it whole
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases and collapses whitespace so trivially different queries share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+def _lookup_policy(normalized_query: str) -> str:
+    docs = query_index(normalized_query)
+    seen = set()
+    parts = []
+    for doc in docs:
+        if doc.page_content in seen:
+            continue
+        seen.add(doc.page_content)
+        parts.append(doc.page_content[:MAX_DOC_CHARS])
+    return "\n".join(parts)
+
 
 @tool
 def policy_rag(query: str) -> str:
     """This is a tool that takes a query and fetches the relevant policy information from the database or documents.
     Use this tool when you need to get policy details, coverage limits, exclusions, or any policy-related information."""
-    docs = query_index(query)
-    combined_content = "\n".join([doc.page_content for doc in docs])
-    return combined_content
+    return _lookup_policy(normalize_query(query))
+
+
+async def aprefetch_policy(query: str) -> str:
+    """Fetches policy context ahead of the agent run (also warms the query cache)"""
+    return await asyncio.to_thread(_lookup_policy, normalize_query(query))
 
 
 tools = [policy_rag]
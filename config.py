@@ -1,3 +1,4 @@
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
@@ -7,4 +8,14 @@ load_dotenv()
 json_parser = JsonOutputParser()
 
 
-llm = ChatOpenAI(model="gpt-4o",temperature=0.3)
\ No newline at end of file
+# One connection pool shared by every OpenAI client (chat + embeddings), so
+# keep-alive TLS sessions are reused across modules and requests
+http_limits = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+http_client = httpx.Client(limits=http_limits, http2=True)
+http_async_client = httpx.AsyncClient(limits=http_limits, http2=True)
+
+
+llm = ChatOpenAI(model="gpt-4o",temperature=0.3, http_client=http_client, http_async_client=http_async_client)
+
+# Cheaper model used by the adjudication agent
+agent_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, http_client=http_client, http_async_client=http_async_client)
@@ -3,9 +3,14 @@ Insurance Claim Processing API
 FastAPI backend that connects: Frontend -> Intake Node -> Agent Executor -> Frontend
 """
 
+import asyncio
+import logging
+import logging.handlers
 import os
+import queue
 import sys
-import json
+from contextlib import asynccontextmanager
+import orjson
 from typing import Optional, AsyncGenerator
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,18 +19,81 @@ from pydantic import BaseModel
 import tempfile
 from rag.rag import ingest_document
 
+
+# Loggers owned by this app; only these get LOG_LEVEL, libraries stay at WARNING
+APP_LOGGERS = ("api", "intake", "extraction_cache")
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as-is; formatting happens on the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+_log_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    Routes log records through a queue; a background QueueListener formats
+    and writes them to stderr, keeping I/O off the request path.
+    Safe to call more than once (only the first call installs handlers).
+    """
+    global _log_listener, _log_handler
+    if _log_listener is not None:
+        return
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("[%(name)s] %(levelname)s %(message)s"))
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+    
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    _log_handler = DeferredQueueHandler(log_queue)
+    root.addHandler(_log_handler)
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def stop_logging() -> None:
+    """Flushes and stops the background log listener"""
+    global _log_listener, _log_handler
+    if _log_listener is not None:
+        logging.getLogger().removeHandler(_log_handler)
+        _log_listener.stop()
+        _log_listener = _log_handler = None
+
+
+logger = logging.getLogger("api")
+
 # Add agents directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "agents"))
 
-from agents.intake_node import intake_node
-from agents.simple_agent import run_agent
-from agents.state import ClaimResponse, IntakeResult, AgentResult
+from agents.intake_node import aintake_node, detect_input_type
+from agents.simple_agent import arun_agent, lookup_cached_agent_result
+from agents.tools import aprefetch_policy
+from agents.state import ClaimResponse, IntakeResult, AgentResult, ExtractedClaimData
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Sets up logging on startup and flushes it on shutdown"""
+    configure_logging(getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
+    try:
+        yield
+    finally:
+        stop_logging()
 
 
 app = FastAPI(
     title="Insurance Claim Processor",
     description="AI-powered insurance claim adjudication system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend
@@ -43,44 +111,64 @@ class ClaimRequest(BaseModel):
     claim_description: str
 
 
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def save_upload_to_temp(file: UploadFile) -> str:
+    """
+    Streams an uploaded file to a temporary file in fixed-size chunks,
+    so memory use stays bounded regardless of upload size.
+    Returns the temporary file path (caller is responsible for deleting it).
+    """
+    suffix = os.path.splitext(file.filename)[1] if file.filename else ".tmp"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            tmp.write(chunk)
+        return tmp.name
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"status": "ok", "message": "Insurance Claim Processor API is running"}
 
 
-async def process_claim_stream(claim_text: str) -> AsyncGenerator[str, None]:
+async def process_claim_stream(claim_text: str) -> AsyncGenerator[bytes, None]:
     """
     Process claim and yield results as NDJSON stream.
     Yields results for each processing node.
     """
+    policy_task = None
     try:
+        # Speculatively fetch policy context for raw text claims while intake runs,
+        # unless the decision is already cached and the agent won't run at all
+        if detect_input_type(claim_text) == "text" and lookup_cached_agent_result(claim_text) is None:
+            policy_task = asyncio.create_task(aprefetch_policy(claim_text))
+        
         # Step 1: Intake Node - Process the text input
-        intake_result: IntakeResult = intake_node(claim_text)
+        intake_result: IntakeResult = await aintake_node(claim_text)
         
         # Build extracted data for frontend
         extracted = intake_result.extracted_data
+        extracted_fields = extracted.model_dump() if extracted else dict.fromkeys(ExtractedClaimData.model_fields)
         intake_data = {
             "node": "Intake Node",
             "data": {
                 "claim_description": intake_result.claim_description,
                 "input_type": intake_result.input_type,
-                "member_id": extracted.member_id if extracted else None,
-                "member_name": extracted.member_name if extracted else None,
-                "policy_number": extracted.policy_number if extracted else None,
-                "treatment_date": extracted.treatment_date if extracted else None,
-                "claim_amount": extracted.claim_amount if extracted else None,
-                "diagnosis": extracted.diagnosis if extracted else None,
-                "doctor_name": extracted.doctor_name if extracted else None,
-                "hospital_name": extracted.hospital_name if extracted else None,
-                "claim_type": extracted.claim_type if extracted else None,
-                "summary": extracted.summary if extracted else None
+                **extracted_fields
             }
         }
-        yield json.dumps(intake_data) + "\n"
+        yield orjson.dumps(intake_data) + b"\n"
         
         # Step 2: Agent Executor - Analyze and make decision
-        agent_result: AgentResult = run_agent(intake_result.claim_description)
+        policy_context = None
+        if policy_task is not None:
+            try:
+                policy_context = await policy_task
+            except Exception as e:
+                logger.warning("Policy prefetch failed, agent will query RAG itself: %s", e)
+        agent_result: AgentResult = await arun_agent(intake_result.claim_description, policy_context)
         
         # Yield policy/decision result
         policy_data = {
@@ -93,7 +181,7 @@ async def process_claim_stream(claim_text: str) -> AsyncGenerator[str, None]:
                 "confidence_score": agent_result.confidence_score
             }
         }
-        yield json.dumps(policy_data) + "\n"
+        yield orjson.dumps(policy_data) + b"\n"
         
         # Yield risk assessment with confidence
         risk_category = "Low" if agent_result.decision == "APPROVED" else "High" if agent_result.decision == "REJECTED" else "Medium"
@@ -130,7 +218,7 @@ async def process_claim_stream(claim_text: str) -> AsyncGenerator[str, None]:
                 "reasons": agent_result.reasoning[:3] if agent_result.reasoning else []
             }
         }
-        yield json.dumps(risk_data) + "\n"
+        yield orjson.dumps(risk_data) + b"\n"
         
         # Yield routing decision with confidence
         processing_path = "Fast-Track" if agent_result.decision == "APPROVED" else "Manual Review" if agent_result.decision == "REJECTED" else "Standard Processing"
@@ -154,14 +242,16 @@ async def process_claim_stream(claim_text: str) -> AsyncGenerator[str, None]:
                 "rationale": "; ".join(agent_result.reasoning[:2]) if agent_result.reasoning else "Standard processing"
             }
         }
-        yield json.dumps(routing_data) + "\n"
+        yield orjson.dumps(routing_data) + b"\n"
         
     except Exception as e:
+        if policy_task is not None and not policy_task.done():
+            policy_task.cancel()
         error_data = {
             "node": "Error",
             "data": {"error": str(e)}
         }
-        yield json.dumps(error_data) + "\n"
+        yield orjson.dumps(error_data) + b"\n"
 
 
 @app.post("/process-claim-stream/")
@@ -193,11 +283,7 @@ async def process_file_claim_streaming(file: UploadFile = File(...)):
         )
     
     # Save file temporarily
-    suffix = os.path.splitext(file.filename)[1] if file.filename else ".tmp"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    tmp_path = await save_upload_to_temp(file)
     
     async def stream_file_processing():
         try:
@@ -221,8 +307,8 @@ async def process_text_claim(request: ClaimRequest):
     Process a text-based insurance claim (non-streaming).
     """
     try:
-        intake_result: IntakeResult = intake_node(request.claim_description)
-        agent_result: AgentResult = run_agent(intake_result.claim_description)
+        intake_result: IntakeResult = await aintake_node(request.claim_description)
+        agent_result: AgentResult = await arun_agent(intake_result.claim_description)
         
         return ClaimResponse(
             intake=intake_result,
@@ -257,15 +343,11 @@ async def process_file_claim(file: UploadFile = File(...)):
                 detail=f"Unsupported file type: {file.content_type}"
             )
         
-        suffix = os.path.splitext(file.filename)[1] if file.filename else ".tmp"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+        tmp_path = await save_upload_to_temp(file)
         
         try:
-            intake_result: IntakeResult = intake_node(tmp_path)
-            agent_result: AgentResult = run_agent(intake_result.claim_description)
+            intake_result: IntakeResult = await aintake_node(tmp_path)
+            agent_result: AgentResult = await arun_agent(intake_result.claim_description)
             
             return ClaimResponse(
                 intake=intake_result,
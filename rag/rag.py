@@ -3,12 +3,19 @@ from pinecone import Pinecone
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_core.documents import Document
+from collections import OrderedDict
+import hashlib
+import numpy as np
 import os
+import threading
+import time
+
+from config import http_client, http_async_client
 
 
 load_dotenv()
 pinecone_api_key = os.getenv("PINECONE_API_KEY")
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small", dimensions=1024)
+embeddings = OpenAIEmbeddings(model="text-embedding-3-small", dimensions=1024, http_client=http_client, http_async_client=http_async_client)
 
 # pinecone setup
 pc = Pinecone(api_key=pinecone_api_key)
@@ -16,12 +23,8 @@ index_name = "plumrag"
 index = pc.Index(index_name)
 vector_store = PineconeVectorStore(index=index, embedding=embeddings)
 
-def query_index(query: str):
-    docs = vector_store.similarity_search(query, k=3)
-    return docs
-
-def ingest_document():
-    context = """{
+# policy document loaded by ingest_document
+POLICY_DOCUMENT = """{
   "policy_id": "PLUM_OPD_2024",
   "policy_name": "Plum OPD Advantage",
   "effective_date": "2024-01-01",
@@ -139,5 +142,141 @@ def ingest_document():
     "instant_approval_limit": 5000
   }
 }"""
-    doc = Document(page_content=context, metadata={"source": "policy_context.json"})
-    vector_store.add_documents([doc])
\ No newline at end of file
+
+# identifies the indexed policy; part of cache keys for anything derived from it
+POLICY_VERSION = f"{index_name}:{hashlib.sha256(POLICY_DOCUMENT.encode('utf-8')).hexdigest()[:16]}"
+
+# number of documents retrieved per query
+MAX_DOCS = 3
+
+# exact (L1) query cache: query text -> retrieved docs
+QUERY_CACHE_SIZE = 1024
+_query_cache = OrderedDict()
+
+# semantic (L2) query cache: prior query embeddings and their retrieved docs
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_SIZE = 256
+_semantic_vectors = np.empty((0, 1024), dtype=np.float32)
+_semantic_docs = []
+_cache_lock = threading.Lock()
+
+def clear_caches():
+    """Empties the exact and semantic query caches (call after the index changes)"""
+    global _semantic_vectors
+    with _cache_lock:
+        _query_cache.clear()
+        _semantic_vectors = _semantic_vectors[:0]
+        _semantic_docs.clear()
+
+def _semantic_lookup(vector: np.ndarray):
+    with _cache_lock:
+        if not _semantic_docs:
+            return None
+        scores = _semantic_vectors @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= SEMANTIC_CACHE_THRESHOLD:
+            return _semantic_docs[best]
+    return None
+
+def _semantic_store(vector: np.ndarray, docs):
+    global _semantic_vectors
+    with _cache_lock:
+        _semantic_vectors = np.vstack([_semantic_vectors, vector[None, :]])[-SEMANTIC_CACHE_SIZE:]
+        _semantic_docs.append(docs)
+        del _semantic_docs[:-SEMANTIC_CACHE_SIZE]
+
+class EmbeddingBatcher:
+    """
+    Coalesces query embeddings submitted concurrently (e.g. parallel policy_rag
+    tool calls) into embed_documents requests of at most max_batch queries.
+    The oldest pending caller leads a flush: if other submitters are in flight
+    it waits up to max_wait seconds (or until max_batch queries are pending),
+    otherwise it embeds immediately. Queries beyond max_batch stay queued for
+    the next leader.
+    """
+
+    def __init__(self, embedder, max_batch: int = 8, max_wait: float = 0.01):
+        self._embedder = embedder
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leading = False
+        self._active = 0
+
+    def submit(self, query: str) -> list[float]:
+        slot = {"query": query, "done": False, "vector": None, "error": None}
+        with self._cond:
+            self._active += 1
+            self._pending.append(slot)
+            self._cond.notify_all()
+            while not slot["done"] and (self._leading or self._pending[0] is not slot):
+                self._cond.wait()
+            if slot["done"]:
+                self._active -= 1
+                return self._result(slot)
+
+            self._leading = True
+            if self._active > 1:
+                deadline = time.monotonic() + self._max_wait
+                while len(self._pending) < self._max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch = self._pending[:self._max_batch]
+            del self._pending[:self._max_batch]
+
+        try:
+            vectors = self._embedder.embed_documents([s["query"] for s in batch])
+            for s, v in zip(batch, vectors):
+                s["vector"] = v
+        except Exception as e:
+            for s in batch:
+                s["error"] = e
+        finally:
+            with self._cond:
+                for s in batch:
+                    s["done"] = True
+                self._leading = False
+                self._active -= 1
+                self._cond.notify_all()
+        return self._result(slot)
+
+    @staticmethod
+    def _result(slot: dict) -> list[float]:
+        if slot["error"] is not None:
+            raise slot["error"]
+        return slot["vector"]
+
+embedding_batcher = EmbeddingBatcher(embeddings)
+
+def query_index(query: str):
+    with _cache_lock:
+        docs = _query_cache.get(query)
+        if docs is not None:
+            _query_cache.move_to_end(query)
+            return docs
+
+    # embed once, reuse the vector for both the semantic cache and the search
+    vector = np.asarray(embedding_batcher.submit(query), dtype=np.float32)
+    vector /= np.linalg.norm(vector) or 1.0
+    docs = _semantic_lookup(vector)
+    if docs is None:
+        docs = vector_store.similarity_search_by_vector(vector.tolist(), k=MAX_DOCS)
+        # empty results (e.g. before ingest) are never cached
+        if not docs:
+            return docs
+        _semantic_store(vector, docs)
+
+    with _cache_lock:
+        _query_cache[query] = docs
+        if len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return docs
+
+def ingest_document():
+    doc = Document(page_content=POLICY_DOCUMENT, metadata={"source": "policy_context.json"})
+    vector_store.add_documents([doc])
+    # drop anything retrieved before this ingest (possibly empty results)
+    clear_caches()
@@ -0,0 +1,20 @@
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agents"))
+
+import numba_b64
+
+
+def test_b64encode_matches_stdlib_above_threshold():
+    base = numba_b64.PARALLEL_THRESHOLD - numba_b64.PARALLEL_THRESHOLD % 3 + 3
+    for length in (base, base + 1, base + 2):
+        data = os.urandom(length)
+        assert numba_b64.b64encode(data) == base64.b64encode(data)
+
+
+def test_b64encode_matches_stdlib_below_threshold():
+    for length in range(0, 10):
+        data = os.urandom(length)
+        assert numba_b64.b64encode(data) == base64.b64encode(data)